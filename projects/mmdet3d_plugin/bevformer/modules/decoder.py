@@ -62,6 +62,10 @@ class DetectionTransformerDecoder(TransformerLayerSequence):
         super(DetectionTransformerDecoder, self).__init__(*args, **kwargs)
         self.return_intermediate = return_intermediate
         self.fp16_enabled = False
+        # Follow the layout of the transformer layers: when they are built
+        # with batch_first=True no (num_query, bs) <-> (bs, num_query)
+        # permutes are needed around the box refinement.
+        self.batch_first = getattr(self.layers[0], 'batch_first', False)
 
     def forward(self,
                 query,
@@ -73,7 +77,9 @@ class DetectionTransformerDecoder(TransformerLayerSequence):
         """Forward function for `Detr3DTransformerDecoder`.
         Args:
             query (Tensor): Input query with shape
-                `(num_query, bs, embed_dims)`.
+                `(num_query, bs, embed_dims)`, or `(bs, num_query,
+                embed_dims)` if the transformer layers are built with
+                `batch_first=True`.
             reference_points (Tensor): The reference
                 points of offset. has shape
                 (bs, num_query, 4) when as_two_stage,
@@ -85,7 +91,9 @@ class DetectionTransformerDecoder(TransformerLayerSequence):
         Returns:
             Tensor: Results with shape [1, num_query, bs, embed_dims] when
                 return_intermediate is `False`, otherwise it has shape
-                [num_layers, num_query, bs, embed_dims].
+                [num_layers, num_query, bs, embed_dims], or
+                [num_layers, bs, num_query, embed_dims] if the transformer
+                layers are built with `batch_first=True`.
         """
         output = query
         intermediate = []
@@ -100,7 +108,8 @@ class DetectionTransformerDecoder(TransformerLayerSequence):
                 reference_points=reference_points_input,
                 key_padding_mask=key_padding_mask,
                 **kwargs)
-            output = output.permute(1, 0, 2)
+            if not self.batch_first:
+                output = output.permute(1, 0, 2)
 
             if reg_branches is not None:
                 tmp = reg_branches[lid](output)
@@ -117,7 +126,8 @@ class DetectionTransformerDecoder(TransformerLayerSequence):
 
                 reference_points = new_reference_points.detach()
 
-            output = output.permute(1, 0, 2)
+            if not self.batch_first:
+                output = output.permute(1, 0, 2)
             if self.return_intermediate:
                 intermediate.append(output)
                 intermediate_reference_points.append(reference_points)
@@ -5,3 +5,4 @@ from .temporal_decoder import (
     LongTermTemporalDecoder,
 )
 from .object_decoder import ObjectDecoder
+from .flash_mha import FlashMHA
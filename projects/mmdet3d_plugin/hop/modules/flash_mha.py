@@ -0,0 +1,135 @@
+import torch
+import torch.nn.functional as F
+from mmcv.cnn.bricks.registry import ATTENTION
+from mmcv.cnn.bricks.transformer import MultiheadAttention
+
+
+@ATTENTION.register_module()
+class FlashMHA(MultiheadAttention):
+    """
+    Multi-head attention evaluated with a fused scaled-dot-product kernel
+
+    Drop-in replacement for the mmcv `MultiheadAttention` wrapper: same
+    config keys, same parameters (they keep living in the wrapped
+    nn.MultiheadAttention, so pretrained checkpoints load unchanged), but
+    the attention itself runs through
+    torch.nn.functional.scaled_dot_product_attention. On PyTorch 2.x this
+    dispatches to a FlashAttention-style kernel that fuses the QK^T scaling,
+    the online softmax and the value aggregation into one launch and never
+    materializes the (num_query, num_key) score matrix.
+    """
+
+    def forward(
+        self,
+        query,
+        key=None,
+        value=None,
+        identity=None,
+        query_pos=None,
+        key_pos=None,
+        attn_mask=None,
+        key_padding_mask=None,
+        **kwargs
+    ):
+        """Forward pass, following the mmcv `MultiheadAttention` semantics
+        Args:
+            query (Tensor): query with shape (bs, num_query, embed_dims) if
+                self.batch_first, else (num_query, bs, embed_dims)
+            key (Tensor): key with the same layout as query. Defaults to query
+            value (Tensor): value with the same layout as query. Defaults to key
+            identity (Tensor): tensor used for the residual connection. Defaults to query
+            query_pos (Tensor): positional encoding added to query
+            key_pos (Tensor): positional encoding added to key
+            attn_mask (Tensor): attention mask with shape (num_query, num_key);
+                boolean True entries are masked out, float masks are added to
+                the attention scores
+            key_padding_mask (Tensor): padding mask with shape (bs, num_key),
+                boolean True entries are masked out
+        Returns:
+            Tensor: attended output with the same shape as query
+        """
+        # scaled_dot_product_attention only exists on PyTorch 2.x; on older
+        # versions fall back to the stock mmcv implementation, unchanged
+        if not hasattr(F, "scaled_dot_product_attention"):
+            return super().forward(
+                query,
+                key=key,
+                value=value,
+                identity=identity,
+                query_pos=query_pos,
+                key_pos=key_pos,
+                attn_mask=attn_mask,
+                key_padding_mask=key_padding_mask,
+                **kwargs
+            )
+
+        if key is None:
+            key = query
+        if value is None:
+            value = key
+        if identity is None:
+            identity = query
+        if key_pos is None and query_pos is not None:
+            if query_pos.shape == key.shape:
+                key_pos = query_pos
+        if query_pos is not None:
+            query = query + query_pos
+        if key_pos is not None:
+            key = key + key_pos
+
+        if not self.batch_first:
+            query = query.transpose(0, 1)
+            key = key.transpose(0, 1)
+            value = value.transpose(0, 1)
+
+        bs, num_query = query.shape[:2]
+        head_dims = self.embed_dims // self.num_heads
+
+        # Same in/out projections as nn.MultiheadAttention, so the weights
+        # are shared with the stock implementation
+        w_q, w_k, w_v = self.attn.in_proj_weight.chunk(3)
+        if self.attn.in_proj_bias is not None:
+            b_q, b_k, b_v = self.attn.in_proj_bias.chunk(3)
+        else:
+            b_q = b_k = b_v = None
+        q = F.linear(query, w_q, b_q)
+        k = F.linear(key, w_k, b_k)
+        v = F.linear(value, w_v, b_v)
+        q = q.view(bs, -1, self.num_heads, head_dims).transpose(1, 2)
+        k = k.view(bs, -1, self.num_heads, head_dims).transpose(1, 2)
+        v = v.view(bs, -1, self.num_heads, head_dims).transpose(1, 2)
+
+        # scaled_dot_product_attention keeps the additive semantics of
+        # nn.MultiheadAttention for float masks but inverts the boolean
+        # convention (True means "attend"), so boolean masks are flipped;
+        # the padding mask is merged bitwise with a boolean attn_mask and
+        # as an additive -inf bias with a float one
+        if attn_mask is not None and attn_mask.dtype == torch.bool:
+            attn_mask = ~attn_mask
+        if key_padding_mask is not None:
+            padding = ~key_padding_mask[:, None, None, :]
+            if attn_mask is None:
+                attn_mask = padding
+            elif attn_mask.dtype == torch.bool:
+                attn_mask = attn_mask & padding
+            else:
+                padding_bias = torch.zeros(
+                    padding.shape, dtype=attn_mask.dtype, device=attn_mask.device
+                )
+                padding_bias.masked_fill_(~padding, float("-inf"))
+                attn_mask = attn_mask + padding_bias
+
+        out = F.scaled_dot_product_attention(
+            q,
+            k,
+            v,
+            attn_mask=attn_mask,
+            dropout_p=self.attn.dropout if self.training else 0.0,
+        )
+        out = out.transpose(1, 2).reshape(bs, num_query, self.embed_dims)
+        out = self.attn.out_proj(out)
+
+        if not self.batch_first:
+            out = out.transpose(0, 1)
+
+        return identity + self.dropout_layer(self.proj_drop(out))
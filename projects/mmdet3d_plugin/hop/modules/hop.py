@@ -49,21 +49,26 @@ class HoP(nn.Module):
         dtype = bev_history[0].dtype
         device = bev_history[0].device
 
-        bev_history.reverse()
+        # Index the sequence without mutating it (no reverse()/pop() on the
+        # caller's list): position i in the reversed sequence corresponds to
+        # bev_history[num_frames - 1 - i]
+        num_frames = len(bev_history)
         B_adj = [
-            bev_history[self.k - 1],
-            bev_history[self.k + 1],
+            bev_history[num_frames - self.k],
+            bev_history[num_frames - self.k - 2],
         ]  # adjacent BEV features at time t-k-1 and t-k+1
-        bev_history.pop(self.k)  # remove BEV feature at time t-k
-        B_rem = bev_history  # remaining BEV features
+        B_rem = torch.stack(
+            [bev_history[num_frames - 1 - i] for i in range(num_frames) if i != self.k]
+        )  # remaining BEV features (feature at time t-k left out), stacked
 
-        # Add temporal positional embeddings to BEV feature maps
-        temporal_pos_embeds = self.temp_embedding.weight.to(dtype).to(device)
-        temporal_pos_embeds = temporal_pos_embeds.unsqueeze(1).repeat(
-            1, self.bev_h * self.bev_w, 1
-        )
-        for t, bev_features in enumerate(B_rem):
-            B_rem[t] = bev_features + temporal_pos_embeds[t, :, :]
+        # Add temporal positional embeddings to the stacked BEV feature maps:
+        # a single broadcasted add over (T, bs, bev_h*bev_w, embed_dims)
+        # instead of one kernel launch per frame, without materializing a
+        # repeated copy of the embeddings
+        temporal_pos_embeds = self.temp_embedding.weight
+        if temporal_pos_embeds.dtype != dtype or temporal_pos_embeds.device != device:
+            temporal_pos_embeds = temporal_pos_embeds.to(dtype=dtype, device=device)
+        B_rem = B_rem + temporal_pos_embeds[: B_rem.size(0), None, None, :]
 
         B_pred = self.temporal_decoder(
             B_adj, B_rem
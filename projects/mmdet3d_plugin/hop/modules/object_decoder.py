@@ -1,14 +1,93 @@
-import copy
+import contextlib
+
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from mmcv.cnn import Linear
-from mmdet.models.utils.transformer import inverse_sigmoid
 from mmcv.cnn.bricks.transformer import build_transformer_layer_sequence
 from mmcv.runner import _load_checkpoint_with_prefix, load_state_dict
 
+# imported for its ATTENTION registration, used in the decoder config below
+from .flash_mha import FlashMHA
+
+
+def _stacked_linear(x, layers, out=None):
+    """Apply N same-shaped nn.Linear layers to the N slices of x as a single
+    batched GEMM.
+    Args:
+        x (Tensor): input with shape (N, M, in_features)
+        layers (list(nn.Linear)): one linear layer per slice of x
+        out (Tensor): optional (N, M, out_features) buffer the GEMM writes
+            into directly; only honored when autograd is disabled (out=
+            variants do not support differentiation)
+    Returns:
+        Tensor: output with shape (N, M, out_features)
+    """
+    weight = torch.stack([layer.weight for layer in layers]).to(x.dtype)
+    bias = torch.stack([layer.bias for layer in layers]).to(x.dtype)
+    if out is not None and not torch.is_grad_enabled():
+        return torch.baddbmm(bias.unsqueeze(1), x, weight.transpose(1, 2), out=out)
+    return torch.baddbmm(bias.unsqueeze(1), x, weight.transpose(1, 2))
+
+
+def _stacked_layer_norm(x, layers):
+    """Apply N same-shaped nn.LayerNorm layers to the N slices of x.
+    Args:
+        x (Tensor): input with shape (N, M, normalized_dim)
+        layers (list(nn.LayerNorm)): one layer norm per slice of x
+    Returns:
+        Tensor: output with shape (N, M, normalized_dim)
+    """
+    x = F.layer_norm(x, x.shape[-1:])
+    weight = torch.stack([layer.weight for layer in layers]).to(x.dtype)
+    bias = torch.stack([layer.bias for layer in layers]).to(x.dtype)
+    return x * weight.unsqueeze(1) + bias.unsqueeze(1)
+
+
+@torch.jit.script
+def _decode_boxes(
+    outputs_coords: torch.Tensor,
+    init_reference_logits: torch.Tensor,
+    inter_references: torch.Tensor,
+    xyz_indices: torch.Tensor,
+    xyz_scale: torch.Tensor,
+    xyz_bias: torch.Tensor,
+) -> torch.Tensor:
+    """Decode the xyz box centers of all decoder layers in place.
+    Args:
+        outputs_coords (Tensor): raw box regressions with shape (num_dec_layers, bs, num_query, code_size)
+        init_reference_logits (Tensor): pre-sigmoid initial reference points with shape (bs, num_query, 3)
+        inter_references (Tensor): refined (sigmoided) references with shape (num_dec_layers, bs, num_query, 3)
+        xyz_indices (Tensor): code columns holding the xyz center, i.e. (0, 1, 4)
+        xyz_scale (Tensor): pc_range extent with shape (3,)
+        xyz_bias (Tensor): pc_range origin with shape (3,)
+    Returns:
+        Tensor: outputs_coords with decoded centers
+
+    Scripted so the whole elementwise chain runs without per-op Python
+    dispatch and the TorchScript fuser can merge the pointwise kernels.
+    The inverse sigmoid is inlined (same clamped form as the local copy in
+    bevformer/modules/decoder.py) to keep the function self-contained.
+    """
+    # Per-layer pre-sigmoid references: the initial logits are reused
+    # directly for the first decoder layer; only the refined references of
+    # the previous layers go through the inverse sigmoid
+    eps = 1e-5
+    ref = inter_references[:-1].clamp(min=0.0, max=1.0)
+    ref = torch.log(ref.clamp(min=eps) / (1.0 - ref).clamp(min=eps))
+    reference = torch.cat([init_reference_logits.unsqueeze(0), ref], dim=0)
+    assert reference.shape[-1] == 3
 
-def _get_clones(module, N):
-    return nn.ModuleList([copy.deepcopy(module) for i in range(N)])
+    xyz = outputs_coords.index_select(-1, xyz_indices)
+    xyz += reference
+    xyz.sigmoid_()
+    # Cast the fp32 affine buffers to the working dtype so the fused
+    # multiply-add does not promote the source (index_copy_ requires
+    # matching dtypes, e.g. for fp16/bf16 BEV features)
+    scale = xyz_scale.to(outputs_coords.dtype)
+    bias = xyz_bias.to(outputs_coords.dtype)
+    outputs_coords.index_copy_(-1, xyz_indices, xyz * scale + bias)
+    return outputs_coords
 
 
 class ObjectDecoder(nn.Module):
@@ -16,7 +95,16 @@ class ObjectDecoder(nn.Module):
     Object decoder module
     """
 
-    def __init__(self, embed_dims, bev_h, bev_w, num_classes, num_query=900):
+    def __init__(
+        self,
+        embed_dims,
+        bev_h,
+        bev_w,
+        num_classes,
+        num_query=900,
+        use_amp=False,
+        use_cuda_graph=False,
+    ):
         """
         Args:
             embed_dims (int): number of embedding dimensions
@@ -24,8 +112,13 @@ class ObjectDecoder(nn.Module):
             bev_w (int): width of BEV feature maps
             num_classes (int): number of classes
             num_query (int): number of queries
+            use_amp (bool): run the decoder and heads under bf16 autocast on CUDA
+            use_cuda_graph (bool): capture the inference forward in a CUDA graph and replay it for repeated fixed-shape calls
         """
         super().__init__()
+        self.use_amp = use_amp
+        self.use_cuda_graph = use_cuda_graph
+        self._graphs = {}
         self.embed_dims = embed_dims
         self.bev_h = bev_h
         self.bev_w = bev_w
@@ -35,6 +128,43 @@ class ObjectDecoder(nn.Module):
         self.cls_out_channels = num_classes
         self.code_size = 10
         self.pc_range = [-51.2, -51.2, -5.0, 51.2, 51.2, 3.0]
+        # On-device affine constants used to map the normalized xyz box
+        # centers back to the point-cloud range, plus the code columns the
+        # centers live in (see forward)
+        self.register_buffer(
+            "xyz_scale",
+            torch.tensor(
+                [
+                    self.pc_range[3] - self.pc_range[0],
+                    self.pc_range[4] - self.pc_range[1],
+                    self.pc_range[5] - self.pc_range[2],
+                ]
+            ),
+            persistent=False,
+        )
+        self.register_buffer(
+            "xyz_bias",
+            torch.tensor([self.pc_range[0], self.pc_range[1], self.pc_range[2]]),
+            persistent=False,
+        )
+        self.register_buffer(
+            "xyz_indices",
+            torch.tensor([0, 1, 4], dtype=torch.long),
+            persistent=False,
+        )
+        # Constant decoder inputs, registered as buffers so they are built
+        # once and moved on-device with the module instead of being created
+        # (host->device copy) on every forward
+        self.register_buffer(
+            "spatial_shapes",
+            torch.tensor([[bev_h, bev_w]], dtype=torch.long),
+            persistent=False,
+        )
+        self.register_buffer(
+            "level_start_index",
+            torch.tensor([0], dtype=torch.long),
+            persistent=False,
+        )
 
         # Load pretrained object decoder and freeze layers
         self.decoder = build_transformer_layer_sequence(
@@ -44,9 +174,13 @@ class ObjectDecoder(nn.Module):
                 return_intermediate=True,
                 transformerlayers=dict(
                     type="DetrTransformerDecoderLayer",
+                    # keep every tensor in (bs, num_query, embed_dims) layout
+                    # so no permutes (full data copies) are needed around the
+                    # decoder
+                    batch_first=True,
                     attn_cfgs=[
                         dict(
-                            type="MultiheadAttention",
+                            type="FlashMHA",
                             embed_dims=embed_dims,
                             num_heads=8,
                             dropout=0.1,
@@ -79,28 +213,288 @@ class ObjectDecoder(nn.Module):
             param.requires_grad = False
         self.decoder.eval()
 
-        # Initialize query embedding and reference points
-        self.query_embedding = nn.Embedding(self.num_query, self.embed_dims * 2)
+        # Initialize query embeddings and reference points. The positional
+        # and content halves are stored as two separate (num_query,
+        # embed_dims) parameters (jointly equivalent to the original
+        # nn.Embedding(num_query, embed_dims * 2) weight), so forward needs
+        # no torch.split
+        self.query_pos_embed = nn.Parameter(
+            torch.empty(self.num_query, self.embed_dims)
+        )
+        self.query_content_embed = nn.Parameter(
+            torch.empty(self.num_query, self.embed_dims)
+        )
+        nn.init.normal_(self.query_pos_embed)
+        nn.init.normal_(self.query_content_embed)
+        # Checkpoints from before the split store one fused
+        # (num_query, 2*embed_dims) table; remap it on load
+        self._register_load_state_dict_pre_hook(self._remap_query_embedding)
         self.reference_points = nn.Linear(self.embed_dims, 3)
+        self._cached_ref_points = None
+        self._qembed_cache = {}
+        self._head_dtype = None
+        self._pool = {}
 
-        # Initialize classification and regression heads
+        # Initialize classification and regression heads. Each decoder layer
+        # gets a freshly constructed branch instead of a copy.deepcopy clone,
+        # which avoids the pickler overhead and the temporary parameter
+        # copies at every init (e.g. once per GPU under DDP)
+        num_pred = self.decoder.num_layers
+        self.cls_branches = nn.ModuleList(
+            [self._build_cls_branch() for _ in range(num_pred)]
+        )
+        self.reg_branches = nn.ModuleList(
+            [self._build_reg_branch() for _ in range(num_pred)]
+        )
+
+        # Compile the head evaluation when available (PyTorch 2.x): inductor
+        # fuses the Linear/LayerNorm/ReLU chains of the branches into far
+        # fewer kernels and removes the Python dispatch cost of the
+        # per-layer loop. Skipped under manual CUDA graph capture, which
+        # must not nest with inductor's own cudagraphs
+        if hasattr(torch, "compile") and not use_cuda_graph:
+            self._run_heads = torch.compile(self._run_heads, mode="reduce-overhead")
+
+    def _build_cls_branch(self):
+        """Build one per-decoder-layer classification head."""
         cls_branch = []
         for _ in range(self.num_reg_fcs):
             cls_branch.append(Linear(self.embed_dims, self.embed_dims))
             cls_branch.append(nn.LayerNorm(self.embed_dims))
             cls_branch.append(nn.ReLU(inplace=True))
         cls_branch.append(Linear(self.embed_dims, self.cls_out_channels))
-        fc_cls = nn.Sequential(*cls_branch)
+        return nn.Sequential(*cls_branch)
 
+    def _build_reg_branch(self):
+        """Build one per-decoder-layer regression head."""
         reg_branch = []
         for _ in range(self.num_reg_fcs):
             reg_branch.append(Linear(self.embed_dims, self.embed_dims))
             reg_branch.append(nn.ReLU())
         reg_branch.append(Linear(self.embed_dims, self.code_size))
-        reg_branch = nn.Sequential(*reg_branch)
-        num_pred = self.decoder.num_layers
-        self.cls_branches = _get_clones(fc_cls, num_pred)
-        self.reg_branches = _get_clones(reg_branch, num_pred)
+        return nn.Sequential(*reg_branch)
+
+    def _run_heads(self, hs):
+        """Apply the per-layer classification and regression heads.
+        Args:
+            hs (Tensor): decoder hidden states with shape (num_dec_layers, bs, num_query, embed_dims)
+        Returns:
+            outputs_classes (Tensor): classification scores with shape (num_dec_layers, bs, num_query, cls_out_channels)
+            outputs_coords (Tensor): raw box regressions with shape (num_dec_layers, bs, num_query, code_size)
+
+        The per-layer branches are _get_clones of the same architecture, so
+        every Linear is evaluated as one batched GEMM over the stacked
+        (num_dec_layers, bs*num_query, ...) activations instead of
+        num_dec_layers separate mm calls. The parameters keep living in the
+        per-layer ModuleLists (the decoder's box refinement indexes
+        reg_branches per layer); stacking the small per-layer weights is
+        negligible next to the GEMMs themselves.
+        """
+        num_layers, bs, num_query, _ = hs.shape
+        x = hs.reshape(num_layers, bs * num_query, self.embed_dims)
+        out_dtype = x.dtype
+        if self._head_dtype is not None and not self.training:
+            x = x.to(self._head_dtype)
+
+        # At inference the intermediate activations come from the per-decoder
+        # scratch pool (reused storage across fixed-shape forwards) and the
+        # final GEMMs write straight into preallocated output buffers. The
+        # outputs are deliberately NOT pooled: they are handed to the caller
+        # and must survive until the next forward
+        pooling = not torch.is_grad_enabled()
+        hidden_shape = (num_layers, bs * num_query, self.embed_dims)
+        cls_out = reg_out = None
+        if pooling:
+            cls_out = torch.empty(
+                (num_layers, bs * num_query, self.cls_out_channels),
+                dtype=x.dtype,
+                device=x.device,
+            )
+            reg_out = torch.empty(
+                (num_layers, bs * num_query, self.code_size),
+                dtype=x.dtype,
+                device=x.device,
+            )
+
+        # cls branches: num_reg_fcs x (Linear, LayerNorm, ReLU) + Linear
+        h = x
+        for i in range(self.num_reg_fcs):
+            scratch = (
+                self._pooled_buffer("cls_fc%d" % i, hidden_shape, x.dtype, x.device)
+                if pooling
+                else None
+            )
+            h = _stacked_linear(
+                h, [branch[3 * i] for branch in self.cls_branches], out=scratch
+            )
+            h = _stacked_layer_norm(
+                h, [branch[3 * i + 1] for branch in self.cls_branches]
+            )
+            h = F.relu(h, inplace=True)
+        outputs_classes = _stacked_linear(
+            h,
+            [branch[3 * self.num_reg_fcs] for branch in self.cls_branches],
+            out=cls_out,
+        ).view(num_layers, bs, num_query, self.cls_out_channels)
+
+        # reg branches: num_reg_fcs x (Linear, ReLU) + Linear
+        h = x
+        for i in range(self.num_reg_fcs):
+            scratch = (
+                self._pooled_buffer("reg_fc%d" % i, hidden_shape, x.dtype, x.device)
+                if pooling
+                else None
+            )
+            h = F.relu(
+                _stacked_linear(
+                    h, [branch[2 * i] for branch in self.reg_branches], out=scratch
+                )
+            )
+        outputs_coords = _stacked_linear(
+            h,
+            [branch[2 * self.num_reg_fcs] for branch in self.reg_branches],
+            out=reg_out,
+        ).view(num_layers, bs, num_query, self.code_size)
+
+        if outputs_classes.dtype != out_dtype:
+            outputs_classes = outputs_classes.to(out_dtype)
+            outputs_coords = outputs_coords.to(out_dtype)
+        return outputs_classes, outputs_coords
+
+    def convert_for_inference(self, dtype=torch.bfloat16):
+        """Run the cls/reg heads in a reduced-precision dtype at inference.
+        Args:
+            dtype (torch.dtype): dtype used for the head GEMMs. Defaults to torch.bfloat16.
+        Returns:
+            ObjectDecoder: self, for chaining
+
+        The heads are pure Linear/LayerNorm/ReLU stacks over
+        (bs, num_query, embed_dims) activations, so their GEMMs tolerate
+        bf16 well: bandwidth is halved and the tensor-core path is used on
+        Ampere+ GPUs. Only the evaluation inside _run_heads is affected -
+        the stored parameters, the decoder's box refinement and the
+        reference_points projection stay in full precision, and the head
+        outputs are cast back to the input dtype.
+        """
+        self._head_dtype = dtype
+        return self
+
+    def _remap_query_embedding(
+        self,
+        state_dict,
+        prefix,
+        local_metadata,
+        strict,
+        missing_keys,
+        unexpected_keys,
+        error_msgs,
+    ):
+        """Split a legacy fused query embedding when loading a checkpoint.
+
+        Checkpoints written before the positional/content split store a
+        single (num_query, 2*embed_dims) table under
+        query_embedding.weight; remap its two halves to the
+        query_pos_embed and query_content_embed parameters so old
+        checkpoints keep loading unchanged.
+        """
+        key = prefix + "query_embedding.weight"
+        if key in state_dict:
+            weight = state_dict.pop(key)
+            state_dict[prefix + "query_pos_embed"] = weight[:, : self.embed_dims]
+            state_dict[prefix + "query_content_embed"] = weight[:, self.embed_dims :]
+
+    def _pooled_buffer(self, name, shape, dtype, device):
+        """Return a reusable scratch tensor from the per-decoder pool.
+        Args:
+            name (str): pool key identifying the buffer
+            shape (tuple): requested buffer shape
+            dtype (torch.dtype): requested buffer dtype
+            device (torch.device): requested buffer device
+        Returns:
+            Tensor: an uninitialized tensor owned by the pool
+
+        Inference-only scratch space: repeated fixed-shape forwards reuse
+        the same storage instead of going through the caching allocator
+        every step. Buffers are keyed by (name, shape, dtype, device), so a
+        new shape or dtype gets its own buffer and existing ones are never
+        evicted - captured CUDA graphs replay through the raw addresses of
+        the buffers they were captured with, which must stay alive.
+        """
+        key = (name, tuple(shape), dtype, device)
+        buf = self._pool.get(key)
+        if buf is None:
+            buf = torch.empty(shape, dtype=dtype, device=device)
+            self._pool[key] = buf
+        return buf
+
+    def _cast_query_embeds(self, dtype):
+        """Return the positional and content query embeddings cast to dtype.
+        Args:
+            dtype (torch.dtype): dtype requested by the incoming BEV features
+        Returns:
+            query_pos (Tensor): positional query embeddings with shape (num_query, embed_dims)
+            query (Tensor): content query embeddings with shape (num_query, embed_dims)
+
+        When the requested dtype differs from the stored parameters (common
+        under mixed precision) the cast copies both tables every forward;
+        at inference the cast result is cached per (dtype, device) - a
+        .to(device) move does not bump ._version, so like the
+        reference-point cache the device must be part of the key - and
+        invalidated when a parameter is updated (tracked via the ._version
+        counters).
+        """
+        if dtype == self.query_pos_embed.dtype:
+            return self.query_pos_embed, self.query_content_embed
+        if self.training or torch.is_grad_enabled():
+            return self.query_pos_embed.to(dtype), self.query_content_embed.to(dtype)
+        cache_key = (dtype, self.query_pos_embed.device)
+        version = (
+            self.query_pos_embed._version,
+            self.query_content_embed._version,
+        )
+        cached = self._qembed_cache.get(cache_key)
+        if cached is None or cached[0] != version:
+            cached = (
+                version,
+                self.query_pos_embed.to(dtype),
+                self.query_content_embed.to(dtype),
+            )
+            self._qembed_cache[cache_key] = cached
+        return cached[1], cached[2]
+
+    def _init_reference_points(self, query_pos):
+        """Project the positional queries to the initial reference points.
+        Args:
+            query_pos (Tensor): positional query embeddings with shape (num_query, embed_dims)
+        Returns:
+            raw_reference (Tensor): pre-sigmoid reference points with shape (num_query, 3)
+            reference_points (Tensor): sigmoided reference points with shape (num_query, 3)
+
+        Both the pre-sigmoid logits and the sigmoided points are returned:
+        the decoder consumes the sigmoided version while the box decoding
+        needs the logits, so handing them out here avoids an
+        inverse_sigmoid(sigmoid(x)) roundtrip in forward. The projection
+        depends only on module parameters, so at inference it is cached and
+        recomputed only when a parameter is updated (tracked via the
+        ._version counters).
+        """
+        if self.training or torch.is_grad_enabled():
+            raw_reference = self.reference_points(query_pos)
+            return raw_reference, raw_reference.sigmoid()
+        version = (
+            self.reference_points.weight._version,
+            self.reference_points.bias._version,
+            self.query_pos_embed._version,
+            query_pos.dtype,
+            query_pos.device,
+        )
+        if self._cached_ref_points is None or self._cached_ref_points[0] != version:
+            raw_reference = self.reference_points(query_pos)
+            self._cached_ref_points = (
+                version,
+                (raw_reference, raw_reference.sigmoid()),
+            )
+        return self._cached_ref_points[1]
 
     def forward(self, bev_embed):
         """Forward function.
@@ -112,75 +506,137 @@ class ObjectDecoder(nn.Module):
                 all_cls_scores: Classification scores
                 all_bbox_preds: Bounding box predictions
         """
+        if (
+            self.use_cuda_graph
+            and not self.training
+            and not torch.is_grad_enabled()
+            and bev_embed.is_cuda
+        ):
+            return self._forward_cuda_graph(bev_embed)
+        return self._forward_impl(bev_embed)
+
+    def _cache_versions(self):
+        """Version counters of the parameters whose cached projections a
+        captured CUDA graph bakes in (see _forward_cuda_graph)."""
+        return (
+            self.reference_points.weight._version,
+            self.reference_points.bias._version,
+            self.query_pos_embed._version,
+            self.query_content_embed._version,
+        )
 
+    def _forward_cuda_graph(self, bev_embed):
+        """Run the inference forward through a captured CUDA graph.
+
+        The forward has static control flow and static shapes for a fixed
+        (bs, bev_h*bev_w) input, so the whole decoder + head evaluation can
+        be captured once and replayed per step, removing the Python and
+        kernel-launch overhead. Graphs are cached per input shape/dtype;
+        each replay only copies the input into the static buffer and clones
+        the static outputs.
+
+        A capture reads the reference-point/query-embedding caches as
+        precomputed tensors (their projection kernels run during warmup,
+        outside the graph), so a graph is only valid for the parameter
+        versions it was captured under; if the parameters have been updated
+        since (e.g. further training), the stale graph is dropped and
+        recaptured.
+        """
+        key = (tuple(bev_embed.shape), bev_embed.dtype)
+        entry = self._graphs.get(key)
+        if entry is not None and entry[4] != self._cache_versions():
+            entry = None
+        if entry is None:
+            # Warm up on a side stream (cuBLAS/cuDNN workspace allocations
+            # and the reference-point cache must not happen during capture)
+            torch.cuda.synchronize()
+            static_input = bev_embed.clone()
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(2):
+                    self._forward_impl(static_input)
+            torch.cuda.current_stream().wait_stream(stream)
+
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                static_outs = self._forward_impl(static_input)
+            # The capture baked in the addresses of the cached
+            # reference-point/query-embedding tensors that existed during
+            # warmup; keep references to them so later cache invalidation
+            # cannot free storage the graph still reads from
+            held_caches = (self._cached_ref_points, dict(self._qembed_cache))
+            entry = (
+                graph,
+                static_input,
+                static_outs,
+                held_caches,
+                self._cache_versions(),
+            )
+            self._graphs[key] = entry
+
+        graph, static_input, static_outs = entry[:3]
+        static_input.copy_(bev_embed)
+        graph.replay()
+        return {
+            name: out.clone() if torch.is_tensor(out) else out
+            for name, out in static_outs.items()
+        }
+
+    def _forward_impl(self, bev_embed):
+        """Eager forward pass, see forward."""
         bs = bev_embed.size(0)
         dtype = bev_embed.dtype
 
-        object_query_embeds = self.query_embedding.weight.to(dtype)
-        query_pos, query = torch.split(object_query_embeds, self.embed_dims, dim=1)
+        query_pos, query = self._cast_query_embeds(dtype)
+
+        raw_reference, reference_points = self._init_reference_points(query_pos)
+        reference_points = reference_points.unsqueeze(0).expand(bs, -1, -1)
+        init_reference_logits = raw_reference.unsqueeze(0).expand(bs, -1, -1)
 
         query_pos = query_pos.unsqueeze(0).expand(bs, -1, -1)
         query = query.unsqueeze(0).expand(bs, -1, -1)
 
-        reference_points = self.reference_points(query_pos)
-        reference_points = reference_points.sigmoid()
-        init_reference_out = reference_points
-
-        query = query.permute(1, 0, 2)
-        query_pos = query_pos.permute(1, 0, 2)
-        bev_embed = bev_embed.permute(1, 0, 2)
-
-        inter_states, inter_references = self.decoder(
-            query=query,
-            key=None,
-            value=bev_embed,
-            query_pos=query_pos,
-            reference_points=reference_points,
-            reg_branches=self.reg_branches,
-            spatial_shapes=torch.tensor(
-                [[self.bev_h, self.bev_w]], device=query.device
-            ),
-            level_start_index=torch.tensor([0], device=query.device),
-        )
+        # The deformable cross-attention over up to bev_h*bev_w keys is
+        # memory bound, so the decoder and the heads optionally run under
+        # bf16 autocast; the reference point projection above and the box
+        # decoding below always stay in full precision
+        if self.use_amp and bev_embed.is_cuda:
+            amp_ctx = torch.autocast(device_type="cuda", dtype=torch.bfloat16)
+        else:
+            amp_ctx = contextlib.nullcontext()
 
-        inter_references_out = inter_references
-        outputs = bev_embed, inter_states, init_reference_out, inter_references_out
-
-        bev_embed, hs, init_reference, inter_references = outputs
-        hs = hs.permute(0, 2, 1, 3)
-        outputs_classes = []
-        outputs_coords = []
-        for lvl in range(hs.shape[0]):
-            if lvl == 0:
-                reference = init_reference
-            else:
-                reference = inter_references[lvl - 1]
-            reference = inverse_sigmoid(reference)
-            outputs_class = self.cls_branches[lvl](hs[lvl])
-            tmp = self.reg_branches[lvl](hs[lvl])
-
-            # TODO: check the shape of reference
-            assert reference.shape[-1] == 3
-            tmp[..., 0:2] += reference[..., 0:2]
-            tmp[..., 0:2] = tmp[..., 0:2].sigmoid()
-            tmp[..., 4:5] += reference[..., 2:3]
-            tmp[..., 4:5] = tmp[..., 4:5].sigmoid()
-            tmp[..., 0:1] = (
-                tmp[..., 0:1] * (self.pc_range[3] - self.pc_range[0]) + self.pc_range[0]
-            )
-            tmp[..., 1:2] = (
-                tmp[..., 1:2] * (self.pc_range[4] - self.pc_range[1]) + self.pc_range[1]
-            )
-            tmp[..., 4:5] = (
-                tmp[..., 4:5] * (self.pc_range[5] - self.pc_range[2]) + self.pc_range[2]
+        with amp_ctx:
+            inter_states, inter_references = self.decoder(
+                query=query,
+                key=None,
+                value=bev_embed,
+                query_pos=query_pos,
+                reference_points=reference_points,
+                reg_branches=self.reg_branches,
+                spatial_shapes=self.spatial_shapes,
+                level_start_index=self.level_start_index,
             )
 
-            outputs_coord = tmp
-            outputs_classes.append(outputs_class)
-            outputs_coords.append(outputs_coord)
+            # inter_states comes out as (num_dec_layers, bs, num_query,
+            # embed_dims) thanks to the batch-first decoder
+            outputs_classes, outputs_coords = self._run_heads(inter_states)
 
-        outputs_classes = torch.stack(outputs_classes)
-        outputs_coords = torch.stack(outputs_coords)
+        if outputs_coords.dtype != dtype:
+            outputs_classes = outputs_classes.to(dtype)
+            outputs_coords = outputs_coords.to(dtype)
+
+        # Scripted post-processing: builds the per-layer pre-sigmoid
+        # references and decodes the xyz centers over code columns (0, 1, 4)
+        # as one fused batched pass (see _decode_boxes)
+        outputs_coords = _decode_boxes(
+            outputs_coords,
+            init_reference_logits,
+            inter_references,
+            self.xyz_indices,
+            self.xyz_scale,
+            self.xyz_bias,
+        )
 
         outs = {
             "bev_embed": bev_embed,
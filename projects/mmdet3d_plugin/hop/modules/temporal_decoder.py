@@ -35,7 +35,7 @@ class TemporalDecoder(nn.Module):
         """Forward pass of the temporal decoder
         Args:
             B_adj (list(Tensor)): adjacent BEV feature (len(B_adj)=2), each element with shape (bs, bev_h*bev_w, embed_dims)
-            B_rem (list(Tensor)): remaining BEV features (len(B_rem)=N-3), each element with shape (bs, bev_h*bev_w, embed_dims)
+            B_rem (Tensor): stacked remaining BEV features with shape (T, bs, bev_h*bev_w, embed_dims)
         Returns:
             B_pred (Tensor): reconstructed BEV feature at time t-k with shape (bs, bev_h*bev_w, embed_dims)
         """
@@ -183,13 +183,13 @@ class LongTermTemporalDecoder(nn.Module):
     def forward(self, B_rem):
         """Forward pass of the long-term temporal decoder
         Args:
-            B_rem (list(Tensor)): remaining BEV features (len(B_rem)=N-3), each element with shape (bs, bev_h*bev_w, embed_dims)
+            B_rem (Tensor): stacked remaining BEV features with shape (T, bs, bev_h*bev_w, embed_dims); iterating it yields one frame per step
         Returns:
             B_long (Tensor): long-term temporal information with shape (bs, bev_h*bev_w, embed_dims)
         """
-        bs = B_rem[0].size(0)
-        dtype = B_rem[0].dtype
-        device = B_rem[0].device
+        bs = B_rem.size(1)
+        dtype = B_rem.dtype
+        device = B_rem.device
         B_long = torch.zeros(
             [bs, self.bev_h * self.bev_w, int(self.embed_dims / self.reduction)]
         ).to(device)